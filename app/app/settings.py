@@ -87,6 +87,11 @@ DATABASES = {
         'NAME': os.environ.get('DB_NAME'),
         'USER': os.environ.get('DB_USER'),
         'PASSWORD': os.environ.get('DB_PASSWORD'),
+        # Seconds a WSGI deployment keeps a connection open for the next
+        # requests, checked before reuse. No effect with runserver, it
+        # closes the connections after every request
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 0)),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
@@ -140,6 +145,13 @@ MEDIA_URL = '/static/media/'
 STATIC_ROOT = '/vol/web/static'
 MEDIA_ROOT = '/vol/web/media'
 
+# Uploads up to this many bytes are kept in memory, larger ones are
+# streamed to a temporary file. Keeping the temporary directory on the
+# media volume lets the storage move the file into place with a rename
+# rather than copying it.
+FILE_UPLOAD_MAX_MEMORY_SIZE = 1024 * 1024
+FILE_UPLOAD_TEMP_DIR = os.environ.get('FILE_UPLOAD_TEMP_DIR')
+
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
@@ -157,4 +169,4 @@ REST_FRAMEWORK = {
 # Enables uploading images on SwaggerUI
 SPECTACULAR_SETTINGS = {
     'COMPONENT_SPLIT_REQUEST': True
-}
\ No newline at end of file
+}
@@ -0,0 +1,29 @@
+"""
+Django settings for running the test suite, on top of the app settings.
+
+Run the tests with `python manage.py test --settings=app.test_settings`.
+"""
+from .settings import *  # noqa: F401,F403
+from .settings import DATABASES, REST_FRAMEWORK
+
+# Password hashing is slow by design; tests don't need that
+PASSWORD_HASHERS = [
+    'django.contrib.auth.hashers.MD5PasswordHasher',
+]
+
+# The test client only needs JSON, skip the browsable API renderer
+REST_FRAMEWORK = {
+    **REST_FRAMEWORK,
+    'DEFAULT_RENDERER_CLASSES': [
+        'rest_framework.renderers.JSONRenderer',
+    ],
+}
+
+# Don't wait for WAL flushes on commit in the test connections, the
+# suite runs many small transactions on data nobody needs to keep
+DATABASES = {
+    'default': {
+        **DATABASES['default'],
+        'OPTIONS': {'options': '-c synchronous_commit=off'},
+    },
+}
@@ -46,7 +46,32 @@ class UserAdmin(BaseUserAdmin):
     )
 
 
+class RecipeAdmin(admin.ModelAdmin):
+    """Define admin pages for recipes."""
+    ordering = ['-id']
+    list_display = ['title', 'user', 'price', 'time_minutes']
+    # Join the user instead of querying it for every row
+    list_select_related = ['user']
+
+    def formfield_for_manytomany(self, db_field, request, **kwargs):
+        """Only load id and name of the tag/ingredient choices."""
+        if db_field.name == 'tags':
+            kwargs['queryset'] = models.Tag.lite.all()
+        elif db_field.name == 'ingredients':
+            kwargs['queryset'] = models.Ingredient.lite.all()
+
+        return super().formfield_for_manytomany(db_field, request, **kwargs)
+
+
+class UserOwnedAdmin(admin.ModelAdmin):
+    """Define admin pages for named objects owned by a user."""
+    ordering = ['name']
+    list_display = ['name', 'user']
+    # Join the user instead of querying it for every row
+    list_select_related = ['user']
+
+
 admin.site.register(models.User, UserAdmin)
-admin.site.register(models.Recipe)
-admin.site.register(models.Tag)
-admin.site.register(models.Ingredient)
+admin.site.register(models.Recipe, RecipeAdmin)
+admin.site.register(models.Tag, UserOwnedAdmin)
+admin.site.register(models.Ingredient, UserOwnedAdmin)
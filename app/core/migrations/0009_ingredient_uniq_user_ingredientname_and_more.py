@@ -0,0 +1,83 @@
+# Generated by Django 4.2.30 on 2026-10-15 20:50
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def _merge_duplicates(model, fields, relations):
+    """Merge the objects of a user sharing the values of `fields` into
+    the oldest one. `relations` lists (through model, column of `model`,
+    other column) of the M2M tables pointing to `model`, their rows are
+    moved over to the kept object."""
+    groups = model.objects.values('user', *fields).annotate(
+        keep_id=Min('id'), count=Count('id'),
+    ).filter(count__gt=1)
+
+    for group in groups:
+        keep_id = group.pop('keep_id')
+        group.pop('count')
+        duplicate_ids = list(
+            model.objects.filter(**group).exclude(id=keep_id)
+            .values_list('id', flat=True)
+        )
+
+        for through, column, other in relations:
+            other_ids = set(through.objects.filter(
+                **{f'{column}_id__in': duplicate_ids}
+            ).values_list(f'{other}_id', flat=True))
+            through.objects.bulk_create(
+                [through(**{f'{column}_id': keep_id, f'{other}_id': other_id})
+                 for other_id in other_ids],
+                ignore_conflicts=True,
+            )
+
+        # Deleting cascades to their remaining M2M rows
+        model.objects.filter(id__in=duplicate_ids).delete()
+
+
+def merge_duplicates(apps, schema_editor):
+    """Merge duplicate tags, ingredients and nutrients, which the API
+    allowed before the unique constraints."""
+    Recipe = apps.get_model('core', 'Recipe')
+    Tag = apps.get_model('core', 'Tag')
+    Ingredient = apps.get_model('core', 'Ingredient')
+    Nutrient = apps.get_model('core', 'Nutrient')
+
+    _merge_duplicates(Tag, ['name'], [
+        (Recipe.tags.through, 'tag', 'recipe'),
+    ])
+    _merge_duplicates(Ingredient, ['name'], [
+        (Recipe.ingredients.through, 'ingredient', 'recipe'),
+        (Ingredient.nutrients.through, 'ingredient', 'nutrient'),
+    ])
+    _merge_duplicates(Nutrient, ['name', 'grams'], [
+        (Ingredient.nutrients.through, 'nutrient', 'ingredient'),
+    ])
+
+    # Run the deferred foreign key checks now, PostgreSQL refuses to
+    # alter the tables below while they are pending
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_remove_nutrient_image_ingredient_image'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('user', 'name'), name='uniq_user_ingredientname'),
+        ),
+        migrations.AddConstraint(
+            model_name='nutrient',
+            constraint=models.UniqueConstraint(fields=('user', 'name', 'grams'), name='uniq_user_nutrientname_grams'),
+        ),
+        migrations.AddConstraint(
+            model_name='tag',
+            constraint=models.UniqueConstraint(fields=('user', 'name'), name='uniq_user_tagname'),
+        ),
+    ]
@@ -4,6 +4,7 @@ Models for Django application
 """
 import uuid
 import os
+import time
 
 from django.conf import settings
 from django.db import models
@@ -14,22 +15,40 @@ from django.contrib.auth.models import (
 )
 
 
+def _uuid7() -> uuid.UUID:
+    """Generate a time-ordered UUID version 7 (RFC 9562):
+    48-bit millisecond timestamp followed by random bits."""
+    timestamp_ms = time.time_ns() // 1_000_000
+    value = (timestamp_ms & 0xFFFFFFFFFFFF) << 80
+    value |= int.from_bytes(os.urandom(10), 'big')
+
+    # Set version (7) and variant (RFC 4122) bits
+    value = value & ~(0xF << 76) | 0x7 << 76
+    value = value & ~(0x3 << 62) | 0x2 << 62
+
+    return uuid.UUID(int=value)
+
+
+def _image_file_path(directory: str, filename: str) -> str:
+    """Generate a sharded file path for a new image, i.e.
+    `uploads/<directory>/<xx>/<yy>/<uuid7><ext>`."""
+    _, dot, ext = filename.rpartition('.')
+    uid = _uuid7().hex
+
+    # UUID7 starts with the timestamp, so shard directories
+    # on its random tail to keep them evenly sized.
+    return (f'uploads/{directory}/{uid[-2:]}/{uid[-4:-2]}/'
+            f'{uid}{dot}{ext if dot else ""}')
+
+
 def recipe_image_file_path(instance, filename: str) -> str:
     """Generate file path for new recipe image."""
-    ext = os.path.splitext(filename)[1]
-    filename = f'{uuid.uuid4()}{ext}'
-
-    # generate path
-    return os.path.join('uploads', 'recipe', filename)
+    return _image_file_path('recipe', filename)
 
 
 def ingredient_image_file_path(instance, filename: str) -> str:
     """Generate file path for new ingredient image."""
-    ext = os.path.splitext(filename)[1]
-    filename = f'{uuid.uuid4()}{ext}'
-
-    # Generate path
-    return os.path.join('uploads', 'ingredient', filename)
+    return _image_file_path('ingredient', filename)
 
 
 class UserManager(BaseUserManager):
@@ -74,6 +93,15 @@ class User(AbstractBaseUser, PermissionsMixin):
     USERNAME_FIELD = "email"
 
 
+class LiteManager(models.Manager):
+    """Manager loading only the id and name of the objects, for
+    read-only contexts like select widgets."""
+
+    def get_queryset(self):
+        """Defer every column apart from id and name."""
+        return super().get_queryset().only('id', 'name')
+
+
 class Recipe(models.Model):
     """Class for creating recipes from the user."""
     user = models.ForeignKey(
@@ -101,6 +129,15 @@ class Tag(models.Model):
     )
     name = models.CharField(max_length=255)
 
+    objects = models.Manager()
+    lite = LiteManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'name'],
+                                    name='uniq_user_tagname'),
+        ]
+
     def __str__(self):
         """Returns tags name."""
         return self.name
@@ -116,6 +153,15 @@ class Ingredient(models.Model):
     nutrients = models.ManyToManyField('Nutrient')
     image = models.ImageField(null=True, upload_to=ingredient_image_file_path)
 
+    objects = models.Manager()
+    lite = LiteManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'name'],
+                                    name='uniq_user_ingredientname'),
+        ]
+
     def __str__(self):
         """String representation on Ingredient database."""
         return self.name
@@ -130,5 +176,11 @@ class Nutrient(models.Model):
     name = models.CharField(max_length=25)
     grams = models.DecimalField(max_digits=5, decimal_places=2)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'name', 'grams'],
+                                    name='uniq_user_nutrientname_grams'),
+        ]
+
     def __str__(self):
         return self.name
@@ -6,6 +6,8 @@ from django.test import TestCase, Client
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 
+from core.models import Recipe, Tag, Ingredient
+
 
 class AdminSiteTests(TestCase):
     """Tests for Django admin."""
@@ -53,3 +55,29 @@ class AdminSiteTests(TestCase):
 
         # Assertions
         self.assertEqual(res.status_code, 200)
+
+    def test_recipes_list(self):
+        """Test recipes are listed with their user in a single query."""
+        for title in ['Pasta', 'Pizza', 'Salad']:
+            Recipe.objects.create(user=self.user, title=title,
+                                  time_minutes=10, price='5.50')
+        url = reverse('admin:core_recipe_changelist')
+
+        # session + user + 2 counts + recipes joined with their users
+        with self.assertNumQueries(5):
+            res = self.client.get(url)
+
+        # Assertions
+        self.assertContains(res, 'Pasta')
+        self.assertContains(res, self.user.email)
+
+    def test_create_recipe_page(self):
+        """Test the add recipe page lists tags and ingredients."""
+        Tag.objects.create(user=self.user, name='Dinner')
+        Ingredient.objects.create(user=self.user, name='Tomato')
+        url = reverse('admin:core_recipe_add')
+        res = self.client.get(url)
+
+        # Assertions
+        self.assertContains(res, 'Dinner')
+        self.assertContains(res, 'Tomato')
@@ -0,0 +1,90 @@
+"""
+# app/core/tests/test_migrations.py
+
+Testing data migrations.
+"""
+from decimal import Decimal
+
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TransactionTestCase
+
+
+class MergeDuplicatesMigrationTests(TransactionTestCase):
+    """Test migration 0009 merges duplicates before adding the
+    unique constraints."""
+    migrate_from = [('core', '0008_remove_nutrient_image_ingredient_image')]
+    migrate_to = [
+        ('core', '0009_ingredient_uniq_user_ingredientname_and_more'),
+    ]
+
+    def _migrate(self, targets):
+        """Migrate to `targets`, returning the models at that state."""
+        executor = MigrationExecutor(connection)
+        executor.migrate(targets)
+        executor.loader.build_graph()
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        """Leave the database at the latest migrations."""
+        executor = MigrationExecutor(connection)
+        self._migrate(executor.loader.graph.leaf_nodes())
+
+    def test_merge_duplicates(self):
+        """Test duplicates are merged into the oldest object, keeping
+        the recipes and nutrients linked to them."""
+        apps = self._migrate(self.migrate_from)
+        User = apps.get_model('core', 'User')
+        Recipe = apps.get_model('core', 'Recipe')
+        Tag = apps.get_model('core', 'Tag')
+        Ingredient = apps.get_model('core', 'Ingredient')
+        Nutrient = apps.get_model('core', 'Nutrient')
+
+        user = User.objects.create(email='test@example.com')
+        other_user = User.objects.create(email='other@example.com')
+        tag, tag_dup = [Tag.objects.create(user=user, name='Lunch')
+                        for _ in range(2)]
+        other_tag = Tag.objects.create(user=other_user, name='Lunch')
+        iron, iron_dup = [
+            Nutrient.objects.create(user=user, name='Iron',
+                                    grams=Decimal('1.00'))
+            for _ in range(2)
+        ]
+        more_iron = Nutrient.objects.create(user=user, name='Iron',
+                                            grams=Decimal('2.00'))
+        egg, egg_dup = [Ingredient.objects.create(user=user, name='Egg')
+                        for _ in range(2)]
+        egg.nutrients.add(iron)
+        egg_dup.nutrients.add(iron_dup, more_iron)
+        recipe, other_recipe = [
+            Recipe.objects.create(user=user, title=title, time_minutes=5,
+                                  price=Decimal('2.50'))
+            for title in ['Omelette', 'Fried Egg']
+        ]
+        recipe.tags.add(tag, tag_dup)
+        recipe.ingredients.add(egg, egg_dup)
+        other_recipe.tags.add(tag_dup)
+        other_recipe.ingredients.add(egg_dup)
+
+        apps = self._migrate(self.migrate_to)
+        Recipe = apps.get_model('core', 'Recipe')
+        Tag = apps.get_model('core', 'Tag')
+        Ingredient = apps.get_model('core', 'Ingredient')
+        Nutrient = apps.get_model('core', 'Nutrient')
+
+        self.assertCountEqual(Tag.objects.values_list('id', flat=True),
+                              [tag.id, other_tag.id])
+        self.assertCountEqual(Nutrient.objects.values_list('id', flat=True),
+                              [iron.id, more_iron.id])
+        self.assertCountEqual(
+            Ingredient.objects.values_list('id', flat=True), [egg.id])
+        self.assertCountEqual(
+            Ingredient.objects.get(id=egg.id).nutrients.values_list(
+                'id', flat=True),
+            [iron.id, more_iron.id])
+        for recipe_id in [recipe.id, other_recipe.id]:
+            merged = Recipe.objects.get(id=recipe_id)
+            self.assertCountEqual(
+                merged.tags.values_list('id', flat=True), [tag.id])
+            self.assertCountEqual(
+                merged.ingredients.values_list('id', flat=True), [egg.id])
@@ -4,13 +4,16 @@
 Testing models.
 """
 from decimal import Decimal
+from django.db import IntegrityError
 from django.test import TestCase
 # Default user model for Auth
 from django.contrib.auth import get_user_model
 
 from .. import models
 
+import time
 from unittest.mock import patch
+from uuid import RFC_4122, UUID
 
 
 def create_user(email, password):
@@ -61,9 +64,10 @@ class ModelTests(TestCase):
 
         # Test Cases
         for inc_email, exp_email in sample_email:
-            user = get_user_model().objects.create_user(inc_email,
-                                                        "samplePassword123")
-            self.assertEqual(user.email, exp_email)
+            with self.subTest(email=inc_email):
+                user = get_user_model().objects.create_user(
+                    inc_email, "samplePassword123")
+                self.assertEqual(user.email, exp_email)
 
     def test_raise_value_error_if_user_does_not_input_email(self):
         """Test creates a user without an email will raise a ValueError."""
@@ -105,6 +109,18 @@ class ModelTests(TestCase):
         # Assertion
         self.assertEqual(str(tag), tag.name)
 
+    def test_tag_name_unique_per_user(self):
+        """Test a user cannot have two tags with the same name."""
+        user = create_user('test@example.com', 'testPass@123')
+        other_user = create_user('other@example.com', 'testPass@123')
+        models.Tag.objects.create(user=user, name='Tag1')
+
+        # Same name is allowed for a different user
+        models.Tag.objects.create(user=other_user, name='Tag1')
+
+        with self.assertRaises(IntegrityError):
+            models.Tag.objects.create(user=user, name='Tag1')
+
     def test_create_ingredient(self):
         """Test create ingredient associated with recipe in db."""
         # Create user
@@ -129,20 +145,44 @@ class ModelTests(TestCase):
         # Assertions
         self.assertEqual(str(nutrient), nutrient.name)
 
-    @patch('core.models.uuid.uuid4')
+    @patch('core.models._uuid7')
     def test_recipe_image_file_path(self, mock_uuid):
         """Test generating image path."""
-        uuid = 'test-uuid'
+        uuid = UUID('0192a5d2-7c4e-7abc-8def-0123456789ab')
         mock_uuid.return_value = uuid
         file_path = models.recipe_image_file_path(None, 'example.jpg')
         # Assertions
-        self.assertEqual(file_path, f'uploads/recipe/{uuid}.jpg')
+        self.assertEqual(file_path,
+                         f'uploads/recipe/ab/89/{uuid.hex}.jpg')
 
-    @patch('core.models.uuid.uuid4')
+    @patch('core.models._uuid7')
     def test_ingredient_image_file_path(self, mock_uuid):
         """Test generating image path."""
-        uuid = 'test-uuid'
+        uuid = UUID('0192a5d2-7c4e-7abc-8def-0123456789ab')
         mock_uuid.return_value = uuid
         file_path = models.ingredient_image_file_path(None, 'example.jpg')
         # Assertion
-        self.assertEqual(file_path, f'uploads/ingredient/{uuid}.jpg')
+        self.assertEqual(file_path,
+                         f'uploads/ingredient/ab/89/{uuid.hex}.jpg')
+
+    @patch('core.models._uuid7')
+    def test_image_file_path_without_extension(self, mock_uuid):
+        """Test generating image path for a file without extension."""
+        uuid = UUID('0192a5d2-7c4e-7abc-8def-0123456789ab')
+        mock_uuid.return_value = uuid
+        file_path = models.recipe_image_file_path(None, 'example')
+        # Assertion
+        self.assertEqual(file_path, f'uploads/recipe/ab/89/{uuid.hex}')
+
+    def test_uuid7_is_time_ordered(self):
+        """Test generated UUIDs are version 7 and sort by creation."""
+        uuids = []
+        for _ in range(3):
+            uuids.append(models._uuid7())
+            time.sleep(0.002)
+
+        # Assertions
+        for uuid in uuids:
+            self.assertEqual(uuid.version, 7)
+            self.assertEqual(uuid.variant, RFC_4122)
+        self.assertEqual(sorted(uuids), uuids)
@@ -2,35 +2,296 @@
 # app/recipe/serializers.py
 Serializers for recipe APIs.
 """
+import copy
+from functools import cached_property
 from typing import List
 
+from django.contrib.postgres.aggregates import JSONBAgg
+from django.core.exceptions import FieldDoesNotExist
+from django.db import transaction
+from django.db.models import (CharField, JSONField, OuterRef, Prefetch,
+                              QuerySet, Subquery, Value,
+                              prefetch_related_objects)
+from django.db.models.functions import Cast, Coalesce, JSONObject
 from rest_framework import serializers
+from drf_spectacular.utils import extend_schema_field
 
 from core.models import Recipe, Tag, Ingredient, Nutrient
 
 
-class TagSerializer(serializers.ModelSerializer):
+def _get_or_create_by_fields(model, user, fields: List[str],
+                             values: List[tuple],
+                             cache: dict = None) -> list:
+    """Fetch `model` objects of the user whose `fields` match the
+    tuples in `values`, creating the missing ones with a single bulk
+    insert. Objects are returned in the order of `values`, without
+    duplicates.
+
+    Objects found in `cache` skip the database, resolved objects are
+    added to it."""
+    values = list(dict.fromkeys(values))
+    if cache is None:
+        cache = {}
+
+    def key_of(obj):
+        return tuple(getattr(obj, field) for field in fields)
+
+    def fetch(keys):
+        # One IN clause per field, exact combinations matched below
+        keys = set(keys)
+        filters = {
+            f'{field}__in': {key[i] for key in keys}
+            for i, field in enumerate(fields)
+        }
+        objs = model.objects.filter(user=user, **filters)
+        return {key_of(obj): obj for obj in objs if key_of(obj) in keys}
+
+    lookup = [key for key in values if (model, user.pk, key) not in cache]
+    if lookup:
+        objs = fetch(lookup)
+
+        missing = [key for key in lookup if key not in objs]
+        if missing:
+            model.objects.bulk_create(
+                [model(user=user, **dict(zip(fields, key)))
+                 for key in missing],
+                ignore_conflicts=True,
+            )
+            # `ignore_conflicts` leaves primary keys unset, re-fetch them.
+            objs.update(fetch(missing))
+
+        for key, obj in objs.items():
+            cache[(model, user.pk, key)] = obj
+
+    return [cache[(model, user.pk, key)] for key in values]
+
+
+def _get_or_create_by_name(model, user, names: List[str],
+                           cache: dict = None) -> list:
+    """Fetch or create `model` objects of the user by name,
+    see `_get_or_create_by_fields()`."""
+    return _get_or_create_by_fields(
+        model, user, ['name'], [(name,) for name in names], cache
+    )
+
+
+def _add_to_new_instance(instance, field: str, objs: list) -> None:
+    """Add `objs` to the `field` M2M relation of a newly created
+    `instance` with a single INSERT. Unlike add(), it skips checking
+    for existing rows, as a new instance has none."""
+    m2m_field = instance._meta.get_field(field)
+    through = m2m_field.remote_field.through
+    source = m2m_field.m2m_field_name()
+    target = m2m_field.m2m_reverse_field_name()
+
+    through.objects.bulk_create(
+        [through(**{source: instance, target: obj}) for obj in objs]
+    )
+
+
+def _set_prefetched(instance, field: str, objs: list) -> None:
+    """Store `objs` as the prefetched `field` relation of `instance`,
+    the way prefetch_related() does."""
+    queryset = getattr(instance, field).all()
+    queryset._result_cache = list(objs)
+    queryset._prefetch_done = True
+
+    if not hasattr(instance, '_prefetched_objects_cache'):
+        instance._prefetched_objects_cache = {}
+    instance._prefetched_objects_cache[field] = queryset
+
+
+class AuthUserSerializerMixin:
+    """Mixin for serializers writing objects owned by the
+    authenticated user."""
+
+    @cached_property
+    def auth_user(self):
+        """Authenticated user of the request, resolved once
+        per serializer instance."""
+        return self.context['request'].user
+
+    @cached_property
+    def request_cache(self) -> dict:
+        """Objects resolved while handling the request, shared by all
+        serializers of the request."""
+        request = self.context['request']
+        if not hasattr(request, '_resolved_objects'):
+            request._resolved_objects = {}
+
+        return request._resolved_objects
+
+
+class UniqueForUserSerializerMixin(AuthUserSerializerMixin):
+    """Mixin for serializers of objects unique per user on
+    `unique_for_user_fields`. The user isn't a serializer field, so
+    DRF doesn't validate the model's unique constraint itself."""
+    unique_for_user_fields: List[str] = []
+
+    def validate(self, attrs: dict) -> dict:
+        """Reject objects clashing with another object of the user."""
+        attrs = super().validate(attrs)
+        # Nested serializers get or create the objects instead, and
+        # without a request there's no user to check against
+        if self.parent is not None or 'request' not in self.context:
+            return attrs
+
+        lookup = {
+            field: attrs.get(field, getattr(self.instance, field, None))
+            for field in self.unique_for_user_fields
+        }
+        model = self.Meta.model
+        queryset = model.objects.filter(user=self.auth_user, **lookup)
+        if self.instance is not None:
+            queryset = queryset.exclude(pk=self.instance.pk)
+        if queryset.exists():
+            raise serializers.ValidationError(
+                f'A {model._meta.verbose_name} with this '
+                f'{" and ".join(self.unique_for_user_fields)} '
+                f'already exists.'
+            )
+
+        return attrs
+
+
+class CachedFieldsSerializerMixin:
+    """Mixin for ModelSerializers to build the fields from the model
+    once per class, instead of on every serializer instance."""
+
+    def get_fields(self):
+        """Return a fresh copy of the fields cached on the class."""
+        serializer_class = type(self)
+        # Look up in the class itself, subclasses build their own
+        fields = serializer_class.__dict__.get('_cached_fields')
+        if fields is None:
+            fields = super().get_fields()
+            serializer_class._cached_fields = fields
+
+        # Fields get bound to the serializer instance, never share them
+        return copy.deepcopy(fields)
+
+
+class EagerLoadingSerializerMixin:
+    """Mixin for ModelSerializers to load the related objects
+    rendered by the serializer along with the queryset."""
+
+    @classmethod
+    def setup_eager_loading(cls, queryset: QuerySet) -> QuerySet:
+        """Return queryset joining FK/OneToOne relations and batch
+        fetching M2M/reverse relations listed in `Meta.fields`,
+        instead of issuing a query per row while serializing."""
+        model = cls.Meta.model
+
+        for name in cls.Meta.fields:
+            field = cls._declared_fields.get(name)
+            source = getattr(field, 'source', None) or name
+            try:
+                model_field = model._meta.get_field(source)
+            except FieldDoesNotExist:
+                continue
+            if not model_field.is_relation:
+                continue
+
+            if model_field.many_to_one or model_field.one_to_one:
+                queryset = queryset.select_related(source)
+                continue
+
+            # Nested serializers load their own relations as well,
+            # fetching only the columns they render
+            nested = getattr(field, 'child', field)
+            if hasattr(nested, 'setup_eager_loading'):
+                related_qs = nested.setup_eager_loading(
+                    model_field.related_model.objects.only(
+                        *nested.get_column_names()
+                    )
+                )
+                queryset = queryset.prefetch_related(
+                    Prefetch(source, queryset=related_qs)
+                )
+            else:
+                queryset = queryset.prefetch_related(source)
+
+        return queryset
+
+    @classmethod
+    def get_column_names(cls) -> List[str]:
+        """Return the names in `Meta.fields` stored in the
+        model's own table."""
+        model = cls.Meta.model
+        names = []
+        for name in cls.Meta.fields:
+            try:
+                model_field = model._meta.get_field(name)
+            except FieldDoesNotExist:
+                continue
+            if model_field.concrete and not model_field.many_to_many:
+                names.append(name)
+        return names
+
+
+class TagSerializer(UniqueForUserSerializerMixin,
+                    CachedFieldsSerializerMixin,
+                    EagerLoadingSerializerMixin,
+                    serializers.ModelSerializer):
     """Serializer for the Tags"""
+    unique_for_user_fields = ['name']
 
     class Meta:
         model = Tag
         fields = ['id', 'name']
-        read_only = ['id']
+        read_only_fields = ['id']
+
+
+class RenderedNutrients(list):
+    """Nutrients of an ingredient already rendered by the database."""
+
 
+class NutrientListSerializer(serializers.ListSerializer):
+    """List serializer passing through nutrients which were already
+    rendered by the database, see IngredientSerializer."""
 
-class NutrientSerializer(serializers.ModelSerializer):
+    def get_attribute(self, instance):
+        if hasattr(instance, 'nutrients_json'):
+            return RenderedNutrients(instance.nutrients_json)
+        return super().get_attribute(instance)
+
+    def to_representation(self, data):
+        if isinstance(data, RenderedNutrients):
+            return list(data)
+        return super().to_representation(data)
+
+
+class NutrientSerializer(UniqueForUserSerializerMixin,
+                         CachedFieldsSerializerMixin,
+                         EagerLoadingSerializerMixin,
+                         serializers.ModelSerializer):
     """Serializer to convert data while sending and retrieving
     nutrient database information"""
+    unique_for_user_fields = ['name', 'grams']
 
     class Meta:
         model = Nutrient
         fields = ['id', 'name', 'grams']
-        read_only = ['id']
+        read_only_fields = ['id']
+        list_serializer_class = NutrientListSerializer
+
+    def to_representation(self, instance: Nutrient) -> dict:
+        """Build the representation directly instead of walking the
+        fields, as nutrients are rendered for every ingredient."""
+        return {
+            'id': instance.id,
+            'name': instance.name,
+            'grams': self.fields['grams'].to_representation(instance.grams),
+        }
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(UniqueForUserSerializerMixin,
+                           CachedFieldsSerializerMixin,
+                           EagerLoadingSerializerMixin,
+                           serializers.ModelSerializer):
     """Serializer to convert data while sending and retrieving
     ingredient database information."""
+    unique_for_user_fields = ['name']
     # Adding NutrientSerializer to retrieve nutrients when
     # creating, retrieving and updating Ingredients via API.
     nutrients = NutrientSerializer(many=True, required=False)
@@ -38,23 +299,54 @@ class IngredientSerializer(serializers.ModelSerializer):
     class Meta:
         model = Ingredient
         fields = ['id', 'name', 'image', 'nutrients']
-        read_only = ['id']
+        read_only_fields = ['id']
+
+    @classmethod
+    def setup_eager_loading(cls, queryset: QuerySet) -> QuerySet:
+        """Render the nutrients of each ingredient as a JSON array in
+        the ingredient query itself, saving the nutrients prefetch
+        query."""
+        through = Ingredient.nutrients.through
+        nutrients = through.objects.filter(
+            ingredient=OuterRef('pk')
+        ).values('ingredient').annotate(
+            json=JSONBAgg(
+                JSONObject(
+                    id='nutrient_id',
+                    name='nutrient__name',
+                    # numeric::text keeps the 2 decimal places, like
+                    # the DecimalField of NutrientSerializer
+                    grams=Cast('nutrient__grams', CharField()),
+                ),
+                ordering='id',
+            )
+        ).values('json')
+
+        return queryset.annotate(nutrients_json=Coalesce(
+            Subquery(nutrients),
+            Value([], output_field=JSONField()),
+        ))
+
+    def _resolve_nutrients(self, nutrients: List[dict]) -> List[Nutrient]:
+        """Method fetches nutrients from the db.
+        If not found creates them."""
+        return _get_or_create_by_fields(
+            Nutrient, self.auth_user, ['name', 'grams'],
+            [(nutrient['name'], nutrient['grams'])
+             for nutrient in nutrients],
+            self.request_cache,
+        )
 
     def _get_or_create_nutrients(self, ingredient: Ingredient,
-                                 nutrients: Nutrient) -> None:
+                                 nutrients: List[dict]) -> None:
         """Method fetches ingredient data from the db.
         If not found creates it."""
-        auth_user = self.context['request'].user
+        nutrient_objs = self._resolve_nutrients(nutrients)
 
-        # Adding ingredients to the recipe
-        for nutrient in nutrients:
-            nutrient_obj, created = Nutrient.objects.get_or_create(
-                user=auth_user,
-                **nutrient
-            )
-            # Add nutrient's object to ingredient
-            ingredient.nutrients.add(nutrient_obj)
+        # Add nutrient's objects to ingredient in a single insert
+        ingredient.nutrients.add(*nutrient_objs)
 
+    @transaction.atomic
     def create(self, validated_data: dict) -> Recipe:
         """Modifying create() method to create recipe functionality."""
         nutrients = validated_data.pop('nutrients', [])
@@ -66,16 +358,17 @@ class IngredientSerializer(serializers.ModelSerializer):
 
         return ingredient
 
+    @transaction.atomic
     def update(self, instance: Ingredient, validated_data: dict) -> Ingredient:
         """Overriding update() method to update nutrients mapped
         inside ingredient."""
-        nutrients = validated_data.pop('nutrients', [])
+        nutrients = validated_data.pop('nutrients', None)
 
         if nutrients is not None:
-            # Removing nutrients from ingredients
-            instance.nutrients.clear()
-            # Adding nutrients to ingredients
-            self._get_or_create_nutrients(instance, nutrients)
+            # Replace the nutrients, set() only writes the difference
+            instance.nutrients.set(self._resolve_nutrients(nutrients))
+            # Nutrients rendered by the query are outdated now
+            instance.__dict__.pop('nutrients_json', None)
 
         # Adding attr:values in validating data to ingredients
         for attr, value in validated_data.items():
@@ -85,7 +378,10 @@ class IngredientSerializer(serializers.ModelSerializer):
         return instance
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class RecipeSerializer(AuthUserSerializerMixin,
+                       CachedFieldsSerializerMixin,
+                       EagerLoadingSerializerMixin,
+                       serializers.ModelSerializer):
     """Serializers for recipes."""
     tags = TagSerializer(many=True, required=False)
     ingredients = IngredientSerializer(many=True, required=False)
@@ -96,33 +392,65 @@ class RecipeSerializer(serializers.ModelSerializer):
                   'time_minutes', 'link', 'tags', 'ingredients']
         read_only_fields = ['id']
 
-    def _get_or_create_tags(self, recipe: Recipe, tags: List[dict]) -> None:
+    def _resolve_tags(self, tags: List[dict]) -> List[Tag]:
+        """Method fetches tags from the db. If not found creates them."""
+        names = [tag['name'] for tag in tags]
+        return _get_or_create_by_name(
+            Tag, self.auth_user, names, self.request_cache
+        )
+
+    def _resolve_ingredients(self,
+                             ingredients: List[dict]) -> List[Ingredient]:
+        """Method fetches ingredients from the db.
+        If not found creates them."""
+        names = [ingredient['name'] for ingredient in ingredients]
+        return _get_or_create_by_name(
+            Ingredient, self.auth_user, names, self.request_cache
+        )
+
+    def _get_or_create_tags(self, recipe: Recipe,
+                            tags: List[dict]) -> List[Tag]:
         """Method fetches data from the db. If not found creates it."""
-        auth_user = self.context['request'].user
-
         # Adding tags to the recipe
-        for tag in tags:
-            tag_obj, created = Tag.objects.get_or_create(
-                user=auth_user,
-                **tag
-            )
-            recipe.tags.add(tag_obj)
+        tag_objs = self._resolve_tags(tags)
+        recipe.tags.add(*tag_objs)
+
+        return tag_objs
 
-    def _get_or_create_ingredients(self, recipe: Recipe,
-                                   ingredients: Ingredient) -> None:
+    def _get_or_create_ingredients(
+            self, recipe: Recipe, ingredients: List[dict]) -> List[Ingredient]:
         """Method fetches ingredient data from the db.
         If not found creates it."""
-        auth_user = self.context['request'].user
-
         # Adding ingredients to the recipe
-        for ingredient in ingredients:
-            ingredient_obj, created = Ingredient.objects.get_or_create(
-                user=auth_user,
-                **ingredient
-            )
-            # Add ingredient's object to recipe
-            recipe.ingredients.add(ingredient_obj)
-
+        ingredient_objs = self._resolve_ingredients(ingredients)
+        recipe.ingredients.add(*ingredient_objs)
+
+        return ingredient_objs
+
+    def _update_related(self, recipe: Recipe, field: str,
+                        items: List[dict], get_or_create) -> list:
+        """Sync the recipe's `field` relation with `items` by name,
+        writing only the difference instead of clearing it. Returns
+        the objects added to the relation."""
+        manager = getattr(recipe, field)
+        incoming = {item['name'] for item in items}
+        current = {obj.name: obj for obj in manager.all()}
+
+        to_remove = [obj for name, obj in current.items()
+                     if name not in incoming]
+        if to_remove:
+            manager.remove(*to_remove)
+        new_items = [item for item in items if item['name'] not in current]
+        added = get_or_create(recipe, new_items) if new_items else []
+
+        # add() and remove() drop the prefetched relation, cache the
+        # result so rendering the response doesn't query it again
+        kept = [obj for name, obj in current.items() if name in incoming]
+        _set_prefetched(recipe, field, kept + list(added))
+
+        return added
+
+    @transaction.atomic
     def create(self, validated_data: dict) -> Recipe:
         """Modifying create() method to create recipe functionality."""
         tags = validated_data.pop('tags', [])
@@ -131,11 +459,20 @@ class RecipeSerializer(serializers.ModelSerializer):
         recipe = Recipe.objects.create(**validated_data)
 
         # Adding tags/ingredients to the recipe
-        self._get_or_create_tags(recipe, tags)
-        self._get_or_create_ingredients(recipe, ingredients)
+        tag_objs = self._resolve_tags(tags)
+        ingredient_objs = self._resolve_ingredients(ingredients)
+        _add_to_new_instance(recipe, 'tags', tag_objs)
+        _add_to_new_instance(recipe, 'ingredients', ingredient_objs)
+
+        # The new recipe has exactly these relations, cache them so
+        # rendering the response doesn't query them again.
+        _set_prefetched(recipe, 'tags', tag_objs)
+        _set_prefetched(recipe, 'ingredients', ingredient_objs)
+        prefetch_related_objects(ingredient_objs, 'nutrients')
 
         return recipe
 
+    @transaction.atomic
     def update(self, instance: Recipe, validated_data: dict) -> Recipe:
         """Overriding update() method to allow writing tags
          and ingredients to the recipe."""
@@ -143,14 +480,16 @@ class RecipeSerializer(serializers.ModelSerializer):
         ingredients = validated_data.pop('ingredients', None)
 
         if tags is not None:
-            instance.tags.clear()
             # Update Tags to the recipe
-            self._get_or_create_tags(instance, tags)
+            self._update_related(instance, 'tags', tags,
+                                 self._get_or_create_tags)
 
         if ingredients is not None:
-            instance.ingredients.clear()
             # Update ingredients to the recipe
-            self._get_or_create_ingredients(instance, ingredients)
+            added = self._update_related(instance, 'ingredients',
+                                         ingredients,
+                                         self._get_or_create_ingredients)
+            prefetch_related_objects(added, 'nutrients')
 
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
@@ -159,13 +498,42 @@ class RecipeSerializer(serializers.ModelSerializer):
         return instance
 
 
+class RecipeListSerializer(RecipeSerializer):
+    """Serializer to list recipes, rendering tags straight from
+    the prefetched rows instead of a nested serializer per tag."""
+    tags = serializers.SerializerMethodField()
+
+    class Meta(RecipeSerializer.Meta):
+        """Leaves out the description, it is only needed
+        on the recipe details."""
+        fields = ['id', 'title', 'price', 'time_minutes', 'link',
+                  'tags', 'ingredients']
+
+    @classmethod
+    def setup_eager_loading(cls, queryset: QuerySet) -> QuerySet:
+        """Prefetch tags on top of the declared relations, loading
+        them the way TagSerializer would."""
+        tags = TagSerializer.setup_eager_loading(
+            Tag.objects.only(*TagSerializer.get_column_names())
+        )
+        return super().setup_eager_loading(queryset).prefetch_related(
+            Prefetch('tags', queryset=tags)
+        )
+
+    @extend_schema_field(TagSerializer(many=True))
+    def get_tags(self, recipe: Recipe) -> List[dict]:
+        """Return the recipe's tags as a list of id/name dicts."""
+        return [{'id': tag.id, 'name': tag.name} for tag in recipe.tags.all()]
+
+
 class RecipeDetailSerializer(RecipeSerializer):
     """Serializer to fetch single recipe details."""
 
     class Meta(RecipeSerializer.Meta):
         """Inherited attributes from `cls: RecipeSerializer`
         to build on this class."""
-        fields = RecipeSerializer.Meta.fields + ['description', 'image']
+        # `description` is already part of RecipeSerializer fields
+        fields = RecipeSerializer.Meta.fields + ['image']
 
 
 class RecipeImageSerializer(serializers.ModelSerializer):
@@ -174,7 +542,7 @@ class RecipeImageSerializer(serializers.ModelSerializer):
     class Meta:
         model = Recipe
         fields = ['id', 'image']
-        read_only = ['id']
+        read_only_fields = ['id']
         extra_kwargs = {
             'image':
                 {'required': 'True'},
@@ -186,7 +554,7 @@ class IngredientImageSerializer(serializers.ModelSerializer):
     class Meta:
         model = Ingredient
         fields = ['id', 'image']
-        read_only = ['id']
+        read_only_fields = ['id']
         extra_kwargs = {
             'image':
                 {'required': 'False'},
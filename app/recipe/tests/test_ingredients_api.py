@@ -5,39 +5,54 @@ import os
 from PIL import Image
 
 from django.contrib.auth import get_user_model
-from django.test import TestCase
-from django.urls import reverse
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse, reverse_lazy
 
 from rest_framework import status
-from rest_framework.test import APIClient
+from rest_framework.test import (APIClient,
+                                 APIRequestFactory,
+                                 force_authenticate)
 
 from core.models import Ingredient, Nutrient, Recipe
 
 from ..serializers import IngredientSerializer
+from ..views import IngredientViewSet
+
+
+User = get_user_model()
 
 
 class TestRequirementsClass:
     """Attributes and Methods which can be inherited and used or
     used directly by calling the class."""
-    _INGREDIENT_URL = reverse('recipe:ingredient-list')
+    _INGREDIENT_URL = reverse_lazy('recipe:ingredient-list')
 
-    def _create_user(self, email: str, password: str) -> get_user_model:
-        return get_user_model().objects.create_user(
-            email=email, password=password
-        )
+    @staticmethod
+    def _create_user(email: str) -> User:
+        # Tests authenticate with force_authenticate(), skip hashing
+        # a password by leaving it unusable
+        return User.objects.create_user(email=email)
 
     def _create_ingredient(self,
-                           user: get_user_model,
+                           user: User,
                            name: str) -> Ingredient:
         return Ingredient.objects.create(user=user, name=name)
 
+    def _create_ingredients(self,
+                            user: User,
+                            names: list) -> list:
+        """Create ingredients directly in db with a single insert."""
+        return Ingredient.objects.bulk_create(
+            [Ingredient(user=user, name=name) for name in names]
+        )
+
     def _ingredient_detail_url(self, ingredient_id: int) -> reverse:
         """Return a auto-generated URL string to Update/Delete
         a particular ingredient."""
         return reverse('recipe:ingredient-detail', args=[ingredient_id])
 
     def _create_nutrient(self,
-                         user: get_user_model,
+                         user: User,
                          nutrient_name: str,
                          grams: float) -> Nutrient:
         return Nutrient.objects.create(user=user,
@@ -45,7 +60,7 @@ class TestRequirementsClass:
                                        grams=Decimal(grams))
 
     def _create_recipe(self,
-                       user: get_user_model,
+                       user: User,
                        **params: dict) -> Recipe:
         """Create recipe directly in db."""
         defaults = {
@@ -62,13 +77,10 @@ class TestRequirementsClass:
         return recipe
 
 
-class PublicTestsIngredientAPI(TestCase, TestRequirementsClass):
+class PublicTestsIngredientAPI(SimpleTestCase, TestRequirementsClass):
     """Public / Unauthorized Test cases for ingredient api."""
-
-    def setUp(self):
-        """Setting up testing environment."""
-        # Instantiating API Client
-        self.client = APIClient()
+    # SimpleTestCase instantiates the client for every test
+    client_class = APIClient
 
     def test_retrieving_ingredient_list_failure(self):
         """Test retrieving ingredient of a user resulting in a failure."""
@@ -88,51 +100,114 @@ class PrivateTestsIngredientAPI(TestCase, TestRequirementsClass):
     2. U -> Update a particular ingredient of a user
     3. D -> Delete a particular ingredient of a user
     """
+    client_class = APIClient
+
+    @classmethod
+    def setUpTestData(cls):
+        """Setting up data shared by the test cases."""
+        # Create user directly in db
+        cls.user = cls._create_user('test@example.com')
 
     def setUp(self):
         """Setting up test environment."""
-        # Create user directly in db
-        self.user = self._create_user('test@example.com', 'password@123')
-        # Instantiate Test Client
-        self.client = APIClient()
         # Authorized user
         self.client.force_authenticate(self.user)
 
     def test_list_ingredients(self):
         """Test returning list of ingredient for authenticated users."""
-        # Create ingredient directly in db
-        ingredient = self._create_ingredient(user=self.user, name='Potato')
+        # Create ingredients directly in db
+        ingredient, _ = self._create_ingredients(self.user,
+                                                 ['Potato', 'Carrot'])
 
-        # HTTP Request
-        res = self.client.get(self._INGREDIENT_URL)
-
-        # Serialize JSON Data with Db Data
-        ingredients = Ingredient.objects.all().order_by('-name')
-        serialized = IngredientSerializer(ingredients, many=True)
+        # HTTP Request, counting and fetching the page whatever the
+        # number of rows
+        with self.assertNumQueries(2):
+            res = self.client.get(self._INGREDIENT_URL)
 
         # Assertions
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(serialized.data, res.data)
+        self.assertEqual(res['X-Total-Count'], '2')
+        self.assertEqual([ingredient['name'] for ingredient in res.data],
+                         ['Potato', 'Carrot'])
         self.assertEqual(res.data[0]['id'], ingredient.id)
-        self.assertEqual(res.data[0]['name'], ingredient.name)
+
+    def test_list_ingredients_with_nutrients_query_count(self):
+        """Test listing ingredients doesn't query nutrients per row."""
+        for name in ['Potato', 'Carrot', 'Onion']:
+            ingredient = self._create_ingredient(user=self.user, name=name)
+            ingredient.nutrients.add(
+                self._create_nutrient(self.user, f'{name} Fiber', '1.20')
+            )
+
+        # Nutrients are aggregated into the ingredients query, next to
+        # the count of the pagination
+        with self.assertNumQueries(2):
+            res = self.client.get(self._INGREDIENT_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        ingredients = Ingredient.objects.order_by('-name')
+        serialized = IngredientSerializer(ingredients, many=True)
+        self.assertEqual(res.data, serialized.data)
+
+    def test_list_ingredients_default_limit(self):
+        """Test listing ingredients without a limit returns a page of
+        the default size, and the limit is capped."""
+        self._create_ingredients(self.user,
+                                 [f'Spice {i:03}' for i in range(101)])
+
+        res = self.client.get(self._INGREDIENT_URL)
+        capped_res = self.client.get(self._INGREDIENT_URL, {'limit': 1000})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['X-Total-Count'], '101')
+        self.assertEqual(len(res.data), 50)
+        self.assertEqual(len(capped_res.data), 100)
+
+    def test_list_ingredients_paginated(self):
+        """Test listing ingredients a page at a time."""
+        self._create_ingredients(self.user, ['Potato', 'Carrot', 'Onion'])
+
+        res = self.client.get(self._INGREDIENT_URL,
+                              {'limit': 2, 'offset': 1})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['X-Total-Count'], '3')
+        self.assertEqual([ingredient['name'] for ingredient in res.data],
+                         ['Onion', 'Carrot'])
 
     def test_update_ingredient(self):
         """Test update ingredient."""
         # Create ingredient directly in the db
         ingredient = self._create_ingredient(user=self.user, name='Tomato')
 
-        # HTTP Request
+        # Call the view directly, routing is covered by other tests
         payload = {
             'name': 'Onion'
         }
+        view = IngredientViewSet.as_view({'put': 'update'})
         url = self._ingredient_detail_url(ingredient.id)
-        res = self.client.put(url, payload, format='json')
+        request = APIRequestFactory().put(url, payload, format='json')
+        force_authenticate(request, user=self.user)
+        res = view(request, pk=ingredient.id)
 
         # Assertions
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(res.data['id'], ingredient.id)
         self.assertEqual(res.data['name'], payload['name'])
 
+    def test_update_ingredient_name_keeps_nutrients(self):
+        """Test updating an ingredient without nutrients keeps them."""
+        ingredient = self._create_ingredient(user=self.user, name='Tomato')
+        nutrient = self._create_nutrient(self.user, 'Lycopene', '2.50')
+        ingredient.nutrients.add(nutrient)
+
+        url = self._ingredient_detail_url(ingredient.id)
+        res = self.client.patch(url, {'name': 'Cherry Tomato'},
+                                format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(list(ingredient.nutrients.all()), [nutrient])
+
     def test_delete_ingredient(self):
         """Test deleting an ingredient."""
         # Create ingredient directly in the db
@@ -162,6 +237,30 @@ class PrivateTestsIngredientAPI(TestCase, TestRequirementsClass):
         self.assertEqual(res.status_code, status.HTTP_201_CREATED)
         self.assertEqual(res.data['name'], payload['name'])
 
+    def test_create_duplicate_ingredient_failure(self):
+        """Test creating an ingredient the user already has fails."""
+        self._create_ingredient(user=self.user, name='Onion')
+
+        res = self.client.post(self._INGREDIENT_URL, {'name': 'Onion'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            Ingredient.objects.filter(user=self.user, name='Onion').count(),
+            1)
+
+    def test_rename_ingredient_to_existing_name_failure(self):
+        """Test renaming an ingredient to the name of another
+        ingredient fails."""
+        self._create_ingredient(user=self.user, name='Onion')
+        ingredient = self._create_ingredient(user=self.user, name='Garlic')
+
+        url = self._ingredient_detail_url(ingredient.id)
+        res = self.client.patch(url, {'name': 'Onion'}, format='json')
+
+        ingredient.refresh_from_db()
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(ingredient.name, 'Garlic')
+
     def test_list_single_ingredient(self):
         """Test retrieve single ingredient upon entering ingredient id."""
         # Create an ingredient in db
@@ -177,13 +276,17 @@ class PrivateTestsIngredientAPI(TestCase, TestRequirementsClass):
 
 class PrivateTestsIngredientAndNutrientsAPI(TestCase, TestRequirementsClass):
     """Test cases for Ingredients and Nutrients."""
+    client_class = APIClient
+
+    @classmethod
+    def setUpTestData(cls):
+        """Setting up data shared by the test cases."""
+        # Create user
+        cls.user = cls._create_user('test@example.com')
 
     def setUp(self):
         """Setting up testing environment."""
-        # Create user
-        self.user = self._create_user('test@example.com', 'password@123')
-        # API Test Client
-        self.client = APIClient()
+        # Authorized user
         self.client.force_authenticate(self.user)
 
     def test_retrieve_ingredient_with_single_nutrient(self):
@@ -267,17 +370,43 @@ class PrivateTestsIngredientAndNutrientsAPI(TestCase, TestRequirementsClass):
         }
 
         res = self.client.post(self._INGREDIENT_URL, payload, format='json')
-        response_data = res.data['nutrients'][0]
 
         # Fetch db data
-        db_data = Ingredient.objects.filter(user=self.user)
-        serialized = IngredientSerializer(db_data, many=True)
+        ingredient = Ingredient.objects.get(user=self.user)
+        expected = {
+            'id': ingredient.id,
+            'name': 'Banana',
+            'image': None,
+            'nutrients': [
+                {'id': nutrient.id, 'name': 'Calcium', 'grams': '3.23'},
+            ],
+        }
 
         # Assertions
         self.assertEqual(res.status_code, status.HTTP_201_CREATED)
-        self.assertEqual(res.data, serialized.data[0])
-        self.assertEqual(response_data['name'], nutrient.name)
-        self.assertEqual(response_data['id'], nutrient.id)
+        self.assertEqual(res.data, expected)
+
+    def test_create_ingredient_with_nutrient_of_other_grams(self):
+        """Test nutrients are matched on both their name and grams"""
+        nutrient = self._create_nutrient(user=self.user,
+                                         nutrient_name='Iron',
+                                         grams='1.50')
+
+        payload = {
+            'name': 'Spinach',
+            'nutrients': [
+                {'name': 'Iron', 'grams': '1.50'},
+                {'name': 'Iron', 'grams': '2.70'},
+            ]
+        }
+        res = self.client.post(self._INGREDIENT_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data['nutrients'][0]['id'], nutrient.id)
+        self.assertEqual(res.data['nutrients'][1]['grams'], '2.70')
+        self.assertEqual(
+            Nutrient.objects.filter(user=self.user, name='Iron').count(), 2
+        )
 
     def test_create_new_ingredient_with_new_nutrients(self):
         """Test creating new ingredient with multiple new nutrients"""
@@ -294,39 +423,25 @@ class PrivateTestsIngredientAndNutrientsAPI(TestCase, TestRequirementsClass):
         res = self.client.post(self._INGREDIENT_URL, payload, format='json')
 
         # Query Database
-        db_data = Ingredient.objects.filter(user=self.user)
-        serialized = IngredientSerializer(db_data, many=True)
+        ingredient = Ingredient.objects.get(user=self.user)
+        db_nutrients = ingredient.nutrients.order_by('id')
 
         # Assertions
         self.assertEqual(res.status_code, status.HTTP_201_CREATED)
 
         # Validating Response data
+        self.assertEqual(res.data['id'], ingredient.id)
         self.assertEqual(
-            res.data['nutrients'][0]['name'],
-            payload['nutrients'][0]['name'])
-        self.assertEqual(
-            res.data['nutrients'][0]['grams'],
-            payload['nutrients'][0]['grams'])
-        self.assertEqual(
-            res.data['nutrients'][1]['name'],
-            payload['nutrients'][1]['name'])
-        self.assertEqual(
-            res.data['nutrients'][1]['grams'],
-            payload['nutrients'][1]['grams'])
+            [{'name': nutrient['name'], 'grams': nutrient['grams']}
+             for nutrient in res.data['nutrients']],
+            payload['nutrients'])
 
         # Validating Database data
         self.assertEqual(
-            serialized.data[0]['nutrients'][0]['name'],
-            payload['nutrients'][0]['name'])
-        self.assertEqual(
-            serialized.data[0]['nutrients'][0]['grams'],
-            payload['nutrients'][0]['grams'])
-        self.assertEqual(
-            serialized.data[0]['nutrients'][1]['name'],
-            payload['nutrients'][1]['name'])
-        self.assertEqual(
-            serialized.data[0]['nutrients'][1]['grams'],
-            payload['nutrients'][1]['grams'])
+            [(nutrient.name, str(nutrient.grams))
+             for nutrient in db_nutrients],
+            [(nutrient['name'], nutrient['grams'])
+             for nutrient in payload['nutrients']])
 
     def test_update_nutrients_inside_ingredient_partiallY(self):
         """Test Updating the nutrient inside ingredient partially."""
@@ -537,12 +652,12 @@ class PrivateTestsIngredientAndNutrientsAPI(TestCase, TestRequirementsClass):
 
 class TestIngredientImageUploads(TestCase, TestRequirementsClass):
     """Tests for testing environment."""
+    client_class = APIClient
 
     def setUp(self):
         """Setting testing environment."""
         # Create user and authenticate.
-        self.user = self._create_user('test@example.com', 'password@123')
-        self.client = APIClient()
+        self.user = self._create_user('test@example.com')
         self.client.force_authenticate(self.user)
 
         # Create ingredient
@@ -3,45 +3,50 @@ Test cases for nutrient APIs.
 """
 from decimal import Decimal
 
-from django.contrib.auth import get_user_model # noqa
-from django.test import TestCase
-from django.urls import reverse
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse_lazy
 
 from rest_framework import status
 from rest_framework.test import APIClient
 
-from core.models import Nutrient # noqa
+from core.models import Ingredient, Nutrient # noqa
 
 from ..serializers import NutrientSerializer # noqa
 
 
+User = get_user_model()
+
+TWO_PLACES = Decimal('0.01')
+
+
 class BaseClass:
-    NUTRIENT_URL = reverse('recipe:nutrient-list')
+    NUTRIENT_URL = reverse_lazy('recipe:nutrient-list')
 
-    def create_user(self, email: str, password: str) -> get_user_model:
-        """Private Method: Create user directly in the database."""
-        return get_user_model().objects.create(
-            email=email, password=password
-        )
+    @staticmethod
+    def create_user(email: str) -> User:
+        """Private Method: Create user directly in the database,
+        with an unusable password as tests force authentication."""
+        return User.objects.create_user(email=email)
 
-    def create_nutrient(self, user: str, name: str, grams: float) -> Nutrient:
-        "Private Method: Create nutrient directly in the database."
+    def create_nutrient(self, user: User, name: str, grams: str) -> Nutrient:
+        """Private Method: Create nutrient directly in the database,
+        with grams rounded to the 2 decimal places stored."""
         return Nutrient.objects.create(
-            user=user, name=name, grams=Decimal(grams)
+            user=user, name=name, grams=Decimal(grams).quantize(TWO_PLACES)
         )
 
-    def nutrient_detail_url(self, nutrient_id: int) -> reverse:
-        """Create reverse URL string PATCH, PUT & DELETE Methods."""
-        return reverse('recipe:nutrient-detail', args=[nutrient_id])
+    def nutrient_detail_url(self, nutrient_id: int) -> str:
+        """Create URL string PATCH, PUT & DELETE Methods.
+        Detail URLs are the list URL followed by the id."""
+        return f'{self.NUTRIENT_URL}{nutrient_id}/'
 
 
-class PublicNutrientAPITests(TestCase, BaseClass):
+class PublicNutrientAPITests(SimpleTestCase, BaseClass):
     """Public test cases which does not
     require user authentication."""
-    def setUp(self):
-        """Setting up testing environment."""
-        # Create a client
-        self.client = APIClient()
+    # SimpleTestCase instantiates the client for every test
+    client_class = APIClient
 
     def test_retrieve_nutrient_list(self):
         """Test retriving list of nutrients."""
@@ -67,14 +72,16 @@ class PrivateNutrientAPITests(TestCase, BaseClass):
     D ->
     8. Delete the nutrient
     """
+    client_class = APIClient
+
+    @classmethod
+    def setUpTestData(cls):
+        """Setting up data shared by the test cases."""
+        # Create user
+        cls.user = cls.create_user(email='test@example.com')
+
     def setUp(self):
         """Setting up testing environment."""
-        # Create user
-        self.user = self.create_user(
-            email='test@example.com', password='testPass@123'
-        )
-        # Create API Test Client
-        self.client = APIClient()
         # Authenticate user with the test client
         self.client.force_authenticate(self.user)
 
@@ -82,20 +89,17 @@ class PrivateNutrientAPITests(TestCase, BaseClass):
         """Test read ingredient via API call."""
         # Create nutrient directly in the db
         nutrient = self.create_nutrient(
-            user=self.user, name='Calcium', grams=5.00)
+            user=self.user, name='Calcium', grams='5.00')
 
         # HTTP Request
-        res = self.client.get(self.NUTRIENT_URL)
-
-        # Formatting data
-        gram_val = float(nutrient.grams)
-        gram_val = format(gram_val, '.2f')
+        with self.assertNumQueries(1):
+            res = self.client.get(self.NUTRIENT_URL)
 
         # Assertions
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(res.data[0]['id'], nutrient.id)
         self.assertEqual(res.data[0]['name'], nutrient.name)
-        self.assertEqual(res.data[0]['grams'], gram_val)
+        self.assertEqual(res.data[0]['grams'], str(nutrient.grams))
 
     def test_create_single_nutrient(self):
         """Test creating a nutrient via API Call."""
@@ -109,9 +113,7 @@ class PrivateNutrientAPITests(TestCase, BaseClass):
         res = self.client.post(self.NUTRIENT_URL, payload)
 
         # Fetch data from db
-        # Serialize JSON Data with Db Data
-        nutrient = Nutrient.objects.all().order_by('-name')
-        serialized_data = NutrientSerializer(nutrient, many=True)
+        nutrient = Nutrient.objects.get(user=self.user)
 
         # Assertions
         self.assertEqual(res.status_code, status.HTTP_201_CREATED)
@@ -119,8 +121,38 @@ class PrivateNutrientAPITests(TestCase, BaseClass):
         self.assertEqual(res.data['name'], payload['name'])
         self.assertEqual(res.data['grams'], payload['grams'])
         # Validating db data
-        self.assertEqual(serialized_data.data[0]['name'], payload['name'])
-        self.assertEqual(serialized_data.data[0]['grams'], payload['grams'])
+        self.assertEqual(nutrient.name, payload['name'])
+        self.assertEqual(str(nutrient.grams), payload['grams'])
+
+    def test_create_duplicate_nutrient_failure(self):
+        """Test creating a nutrient with the name and grams of an
+        existing one fails, other grams are a different nutrient."""
+        self.create_nutrient(user=self.user, name='Calcium', grams='5.00')
+
+        res = self.client.post(self.NUTRIENT_URL,
+                               {'name': 'Calcium', 'grams': '5.00'})
+        other_res = self.client.post(self.NUTRIENT_URL,
+                                     {'name': 'Calcium', 'grams': '2.50'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(other_res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            Nutrient.objects.filter(user=self.user, name='Calcium').count(),
+            2)
+
+    def test_update_nutrient_to_existing_one_failure(self):
+        """Test updating a nutrient into the name and grams of another
+        nutrient fails."""
+        self.create_nutrient(user=self.user, name='Calcium', grams='5.00')
+        nutrient = self.create_nutrient(
+            user=self.user, name='Calcium', grams='3.00')
+
+        url = self.nutrient_detail_url(nutrient.id)
+        res = self.client.patch(url, {'grams': '5.00'}, format='json')
+
+        nutrient.refresh_from_db()
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(str(nutrient.grams), '3.00')
 
     def test_updating_existing_nutrient_partially(self):
         """Test updating an existing nutrient partially with PATCH METHOD"""
@@ -139,19 +171,16 @@ class PrivateNutrientAPITests(TestCase, BaseClass):
         res = self.client.patch(url, payload, format='json')
 
         # Query Database
-        db_data = Nutrient.objects.filter(
-            user=self.user, id=nutrient.id
-        )
-        serialized_data = NutrientSerializer(db_data, many=True)
+        nutrient.refresh_from_db()
 
         # Assertions
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         # Validate response data
-        self.assertEqual(res.data['name'], nutrient.name)
+        self.assertEqual(res.data['name'], 'Calcium')
         self.assertEqual(res.data['grams'], payload['grams'])
         # Validate Database data
-        self.assertEqual(serialized_data.data[0]['name'], nutrient.name)
-        self.assertEqual(serialized_data.data[0]['grams'], payload['grams'])
+        self.assertEqual(nutrient.name, 'Calcium')
+        self.assertEqual(str(nutrient.grams), payload['grams'])
 
     def test_updating_existing_nutrient_completely(self):
         """Test updating an existing nutrient completely with PUT METHOD"""
@@ -171,10 +200,7 @@ class PrivateNutrientAPITests(TestCase, BaseClass):
         res = self.client.put(url, payload, format='json')
 
         # Query Database
-        db_data = Nutrient.objects.filter(
-            user=self.user, id=nutrient.id
-        )
-        serialized_data = NutrientSerializer(db_data, many=True)
+        nutrient.refresh_from_db()
 
         # Assertions
         self.assertEqual(res.status_code, status.HTTP_200_OK)
@@ -182,8 +208,8 @@ class PrivateNutrientAPITests(TestCase, BaseClass):
         self.assertEqual(res.data['name'], payload['name'])
         self.assertEqual(res.data['grams'], payload['grams'])
         # Validate Database data
-        self.assertEqual(serialized_data.data[0]['name'], payload['name'])
-        self.assertEqual(serialized_data.data[0]['grams'], payload['grams'])
+        self.assertEqual(nutrient.name, payload['name'])
+        self.assertEqual(str(nutrient.grams), payload['grams'])
 
     def test_delete_nutrient(self):
         """Test deleting the nutrient via API."""
@@ -204,3 +230,36 @@ class PrivateNutrientAPITests(TestCase, BaseClass):
         # Assertions
         self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
         self.assertFalse(db_data.exists())
+
+
+class NutrientSerializerTests(SimpleTestCase):
+    """Serializer test cases, which don't need the database."""
+
+    def test_serialize_nutrient(self):
+        """Test rendering a nutrient with grams as a string."""
+        nutrient = Nutrient(id=1, name='Protein', grams=Decimal('4.5'))
+
+        data = NutrientSerializer(nutrient).data
+
+        self.assertEqual(data, {'id': 1, 'name': 'Protein', 'grams': '4.50'})
+
+    def test_serialize_nested_nutrients(self):
+        """Test nutrients rendered by the database are passed through."""
+        rendered = [{'id': 1, 'name': 'Protein', 'grams': '4.50'}]
+        ingredient = Ingredient(id=1, name='Egg')
+        ingredient.nutrients_json = rendered
+        serializer = NutrientSerializer(many=True)
+
+        data = serializer.get_attribute(ingredient)
+
+        self.assertEqual(serializer.to_representation(data), rendered)
+
+    def test_validate_nutrient_grams(self):
+        """Test grams have to fit in 5 digits with 2 decimal places."""
+        for grams, valid in [('999.99', True), ('1000', False),
+                             ('1.234', False), ('abc', False)]:
+            with self.subTest(grams=grams):
+                serializer = NutrientSerializer(
+                    data={'name': 'Protein', 'grams': grams}
+                )
+                self.assertEqual(serializer.is_valid(), valid)
@@ -1,5 +1,8 @@
 """
 Tests for recipe APIs.
+
+Every test here runs inside TestCase's transaction and is rolled back
+afterwards, so the test database can be reused with --keepdb.
 """
 from decimal import Decimal
 import tempfile
@@ -8,24 +11,29 @@ import os
 from PIL import Image
 
 from django.contrib.auth import get_user_model
-from django.test import TestCase
-from django.urls import reverse
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse, reverse_lazy
 
 from rest_framework import status
 from rest_framework.test import APIClient
 
 from core.models import Recipe, Tag, Ingredient
 
-from ..serializers import RecipeSerializer, RecipeDetailSerializer
+from ..serializers import (RecipeSerializer,
+                           RecipeListSerializer,
+                           RecipeDetailSerializer)
+
 
-from unittest import skip # noqa
+User = get_user_model()
 
-RECIPE_URL = reverse('recipe:recipe-list')
+RECIPE_URL = reverse_lazy('recipe:recipe-list')
 
 
 def recipe_detail_url(recipe_id):
-    """Returns custom recipe URL."""
-    return reverse('recipe:recipe-detail', args=[recipe_id])
+    """Returns custom recipe URL, the list URL followed by the id."""
+    return f'{RECIPE_URL}{recipe_id}/'
 
 
 def create_user(**params):
@@ -36,25 +44,32 @@ def create_user(**params):
     }
 
     defaults.update(params)
-    user = get_user_model().objects.create_user(**defaults)
+    user = User.objects.create_user(**defaults)
 
     return user
 
 
+_RECIPE_DEFAULTS = {
+    'title': 'Sample Title Name',
+    'time_minutes': 25,
+    'price': Decimal('10.5'),
+    'description': 'This is a sample description.',
+    'link': 'https://example.com',
+}
+
+
 def create_recipe(user, **params):
     """Create recipe directly in db."""
-    defaults = {
-        'title': 'Sample Title Name',
-        'time_minutes': 25,
-        'price': Decimal('10.5'),
-        'description': 'This is a sample description.',
-        'link': 'https://example.com',
-    }
+    return Recipe.objects.create(user=user, **{**_RECIPE_DEFAULTS, **params})
+
 
-    defaults.update(**params)
-    recipe = Recipe.objects.create(user=user, **defaults)
+def bulk_create_recipes(user, n=2, **params):
+    """Create `n` recipes directly in db with a single insert."""
+    defaults = {**_RECIPE_DEFAULTS, **params}
 
-    return recipe
+    return Recipe.objects.bulk_create(
+        [Recipe(user=user, **defaults) for _ in range(n)]
+    )
 
 
 def create_tag(user: str, tag_name: str) -> Tag:
@@ -66,13 +81,10 @@ def create_ingredient(user: str, ingredient_name: str) -> Ingredient:
     return Ingredient.objects.create(user=user, name=ingredient_name)
 
 
-class PublicRecipeAPITests(TestCase):
+class PublicRecipeAPITests(SimpleTestCase):
     """Test case of Recipe API for un-authorized user."""
-
-    def setUp(self):
-        """Setting up test environment."""
-        # Init Test client
-        self.client = APIClient()
+    # SimpleTestCase instantiates the client for every test
+    client_class = APIClient
 
     def test_retrieve_recipe_list_failure(self):
         """Test retrieving recipe list to fail."""
@@ -84,61 +96,85 @@ class PublicRecipeAPITests(TestCase):
 
 class PrivateRecipeAPITests(TestCase):
     """Test cases of Recipe APIs for autorized users."""
+    client_class = APIClient
 
-    def setUp(self):
-        """Setting up test environment."""
+    @classmethod
+    def setUpTestData(cls):
+        """Setting up data shared by the test cases."""
         # Creating a user and other user for testing
-        self.user = create_user()
-        self.other_user = create_user(
+        cls.user = create_user()
+        cls.other_user = create_user(
             email='other_user@example.com',
             password='OtherPass123')
-        # Init Test client
-        self.client = APIClient()
-        self.other_client = APIClient()
+
+    def setUp(self):
+        """Setting up test environment."""
         # Authenticate user
         self.client.force_authenticate(self.user)
-        self.other_client.force_authenticate(self.other_user)
 
     def test_retrieve_recipes(self):
         """Test retrieve recipes."""
         # Creating recipes directly in db
-        create_recipe(user=self.user)
-        create_recipe(user=self.user)
+        recipes = bulk_create_recipes(self.user, n=2)
 
         # HTTP Request to Endpoint
         res = self.client.get(RECIPE_URL)
 
-        # Fetching data from db
-        recipe = Recipe.objects.all().order_by('-id')
-        serializer = RecipeSerializer(recipe, many=True)
-
-        # Assertion
+        # Assertion, newest recipes first
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual([recipe['id'] for recipe in res.data],
+                         [recipes[1].id, recipes[0].id])
+        self.assertTrue(all(recipe['title'] == _RECIPE_DEFAULTS['title']
+                            for recipe in res.data))
 
     def test_retrieve_recipe_for_specific_user(self):
         """Test retrieving data for specific user."""
-        # Creating users
-        params = {
-            'email': 'test2@example.com',
-            'password': 'TestPassword321'
-        }
-        other_user = create_user(**params)
+        # Creating recipes for both users with a single insert
+        _, recipe = Recipe.objects.bulk_create([
+            Recipe(user=self.other_user, **_RECIPE_DEFAULTS),
+            Recipe(user=self.user, **_RECIPE_DEFAULTS),
+        ])
 
-        # Creating recipes
-        create_recipe(user=other_user)
+        # HTTP Request to Endpoint
+        res = self.client.get(RECIPE_URL)
+
+        # Assertions
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data), 1)
+        self.assertEqual(res.data[0]['id'], recipe.id)
+
+    def test_retrieve_recipes_with_tags_query_count(self):
+        """Test listing recipes doesn't query tags per recipe."""
+        recipes = bulk_create_recipes(self.user, n=3)
+        tags = Tag.objects.bulk_create(
+            [Tag(user=self.user, name=name) for name in ['Vegan', 'Dinner']]
+        )
+        Recipe.tags.through.objects.bulk_create([
+            Recipe.tags.through(recipe_id=recipe.id, tag_id=tag.id)
+            for recipe in recipes for tag in tags
+        ])
+
+        # Recipes, then one prefetch each for tags and ingredients
+        with self.assertNumQueries(3):
+            res = self.client.get(RECIPE_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data), 3)
+        self.assertTrue(all(
+            {tag['name'] for tag in recipe['tags']} == {'Vegan', 'Dinner'}
+            for recipe in res.data
+        ))
+
+    def test_retrieve_recipes_without_description(self):
+        """Test recipe list leaves out the description."""
         create_recipe(user=self.user)
 
         # HTTP Request to Endpoint
         res = self.client.get(RECIPE_URL)
 
-        # Fetch details from db
-        recipe = Recipe.objects.filter(user=self.user)
-        serializer = RecipeSerializer(recipe, many=True)
-
         # Assertions
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertNotIn('description', res.data[0])
 
     def test_retrieve_recipe_details(self):
         # Create a recipe directly in db
@@ -192,14 +228,14 @@ class PrivateRecipeAPITests(TestCase):
         url = recipe_detail_url(recipe.id)
         res = self.client.patch(url, payload)
 
-        # Refreshing recipe data from db
-        recipe.refresh_from_db()
+        # Refreshing the checked fields of the recipe from db
+        recipe.refresh_from_db(fields=['title', 'time_minutes', 'user'])
 
         # Assertions
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(recipe.title, payload['title'])
         self.assertEqual(recipe.time_minutes, payload['time_minutes'])
-        self.assertEqual(recipe.user, self.user)
+        self.assertEqual(recipe.user_id, self.user.id)
 
     def test_full_update(self):
         """Test updating all the fields of the recipe."""
@@ -231,22 +267,12 @@ class PrivateRecipeAPITests(TestCase):
 
     def test_updating_user_in_recipe_returns_no_success(self):
         """Test changing creator of recipe returns no success."""
-        # Creating user and adding authentication to it.
-        creds = {
-            'email': 'otherUser@example.com',
-            'password': 'DiffPassword123',
-        }
-        new_user = create_user(**creds)
-
-        new_client = APIClient()
-        new_client.force_authenticate(new_user)
-
         # Create a recipe
         recipe = create_recipe(user=self.user)
 
         # Creating Payload
         payload = {
-            'user': new_user.id,
+            'user': self.other_user.id,
         }
 
         # HTTP 'PATCH' Request to update the user
@@ -281,8 +307,10 @@ class PrivateRecipeAPITests(TestCase):
         recipe = create_recipe(user=self.user)
 
         # HTTP Request from `other_user` to delete `self.user`'s recipe
+        other_client = self.client_class()
+        other_client.force_authenticate(self.other_user)
         url = recipe_detail_url(recipe.id)
-        res = self.other_client.delete(url)
+        res = other_client.delete(url)
 
         # Assertions
         self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
@@ -304,22 +332,22 @@ class PrivateRecipeAPITests(TestCase):
         res = self.client.post(RECIPE_URL, payload, format='json')
 
         # Fetching db data
-        recipes = Recipe.objects.filter(user=self.user)
-        recipe = recipes[0]
-        tags = recipe.tags
+        recipes = list(
+            Recipe.objects.filter(user=self.user).prefetch_related('tags'))
+        tags = recipes[0].tags.all()
 
         # Assertions
         self.assertEqual(res.status_code, status.HTTP_201_CREATED)
-        self.assertEqual(recipes.count(), 1)
-        self.assertEqual(tags.count(), 2)
-        for tag in payload['tags']:
-            exists = tags.filter(name=tag['name'], user=self.user).exists()
-            self.assertTrue(exists)
+        self.assertEqual(len(recipes), 1)
+        self.assertEqual(len(tags), 2)
+        self.assertTrue(all(tag.user_id == self.user.id for tag in tags))
+        self.assertEqual({tag.name for tag in tags},
+                         {tag['name'] for tag in payload['tags']})
 
     def test_create_recipe_with_existing_tag(self):
         """Test creating recipe with existing tag(s)"""
         # Create a tag
-        tag = create_tag(user=self.user, tag_name='Carrot')
+        create_tag(user=self.user, tag_name='Carrot')
 
         # HTTP Request
         payload = {
@@ -337,20 +365,40 @@ class PrivateRecipeAPITests(TestCase):
         res = self.client.post(RECIPE_URL, payload, format='json')
 
         # Fetch db data
-        recipes = Recipe.objects.filter(user=self.user)
-        recipe = recipes[0]
-        tags = recipe.tags
+        recipes = list(
+            Recipe.objects.filter(user=self.user).prefetch_related('tags'))
+        tags = recipes[0].tags.all()
+
+        # Assertions
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(recipes), 1)
+        self.assertEqual(len(tags), 3)
+        self.assertTrue(all(tag.user_id == self.user.id for tag in tags))
+        self.assertEqual({tag.name for tag in tags},
+                         {tag['name'] for tag in payload['tags']})
+
+    def test_create_recipe_with_duplicate_tags(self):
+        """Test repeated tag names in payload create a single tag."""
+        # HTTP Request
+        payload = {
+            'title': 'Sample Title Name',
+            'time_minutes': 25,
+            'price': Decimal('10.5'),
+            'tags': [
+                {'name': 'Dinner'},
+                {'name': 'Dinner'},
+            ]
+        }
+        res = self.client.post(RECIPE_URL, payload, format='json')
+
+        # Fetch db data
+        recipe = Recipe.objects.get(id=res.data['id'])
 
         # Assertions
         self.assertEqual(res.status_code, status.HTTP_201_CREATED)
-        self.assertEqual(recipes.count(), 1)
-        self.assertEqual(tags.count(), 3)
-        for tag in payload['tags']:
-            exists = Tag.objects.filter(
-                user=self.user,
-                name=tag['name']
-            ).exists()
-            self.assertTrue(exists)
+        self.assertEqual(recipe.tags.count(), 1)
+        self.assertEqual(
+            Tag.objects.filter(user=self.user, name='Dinner').count(), 1)
 
     def test_update_recipe_adding_new_tag(self):
         """Test update recipe adding new tag."""
@@ -366,20 +414,14 @@ class PrivateRecipeAPITests(TestCase):
         url = recipe_detail_url(recipe.id)
         res = self.client.patch(url, payload, format='json')
 
-        # Refresh db
-        recipe.refresh_from_db()
-        tags = recipe.tags
+        # Fetch the recipe's tag names from db
+        tag_names = list(
+            recipe.tags.filter(user=self.user).values_list('name', flat=True))
 
         # Assertions
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(tags.count(), 1)
-        for tag in payload['tags']:
-            exists = Tag.objects.filter(
-                user=self.user,
-                name=tag['name']
-            ).exists()
-
-            self.assertTrue(exists)
+        self.assertCountEqual(tag_names,
+                              [tag['name'] for tag in payload['tags']])
 
     def test_update_recipe_with_existing_tag(self):
         """Test to update recipe with an existing tag."""
@@ -400,6 +442,26 @@ class PrivateRecipeAPITests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertIn(tag, recipe.tags.all())
 
+    def test_update_recipe_replacing_some_tags(self):
+        """Test updating recipe tags keeps the tags still present."""
+        # Create recipe and tags directly in db
+        recipe = create_recipe(user=self.user)
+        tag1 = create_tag(user=self.user, tag_name='Carrot')
+        tag2 = create_tag(user=self.user, tag_name='Brinjal')
+        recipe.tags.add(tag1, tag2)
+
+        # HTTP Request
+        payload = {'tags': [{'name': 'Brinjal'}, {'name': 'Onion'}]}
+        url = recipe_detail_url(recipe.id)
+        res = self.client.patch(url, payload, format='json')
+
+        # Assertions
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            set(recipe.tags.values_list('name', flat=True)),
+            {'Brinjal', 'Onion'})
+        self.assertIn(tag2, recipe.tags.all())
+
     def test_clear_recipe_tags(self):
         """Test clearing out all all tags in a recipe."""
         # Create recipe and tags directly in db
@@ -498,13 +560,12 @@ class PrivateRecipeAPITests(TestCase):
     def test_retrieving_existing_recipe_with_multiple_ingredients(self):
         """Test reading existing recipe with multiple existing ingredient"""
         # Create Recipe and Ingredient and add ingredient to it.
-        ingredient1 = create_ingredient(user=self.user,
-                                        ingredient_name='Banana')
-        ingredient2 = create_ingredient(user=self.user,
-                                        ingredient_name='Apple')
+        ingredient1, ingredient2 = Ingredient.objects.bulk_create([
+            Ingredient(user=self.user, name='Banana'),
+            Ingredient(user=self.user, name='Apple'),
+        ])
         recipe = create_recipe(user=self.user)
-        recipe.ingredients.add(ingredient1)
-        recipe.ingredients.add(ingredient2)
+        recipe.ingredients.add(ingredient1, ingredient2)
 
         # HTTP Request
         url = recipe_detail_url(recipe.id)
@@ -538,13 +599,11 @@ class PrivateRecipeAPITests(TestCase):
         # Assertions
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         # Asserting to check ingredients present in recipe?
-        for ingredient in payload['ingredients']:
-            exists = Ingredient.objects.filter(
-                user=self.user,
-                name=ingredient['name']
-            ).exists()
-
-            self.assertTrue(exists)
+        ingredient_names = recipe.ingredients.filter(
+            user=self.user).values_list('name', flat=True)
+        self.assertCountEqual(
+            ingredient_names,
+            [ingredient['name'] for ingredient in payload['ingredients']])
 
     def test_update_recipe_with_existing_ingredient(self):
         """Test Updating existing recipe with existing ingredient"""
@@ -567,13 +626,31 @@ class PrivateRecipeAPITests(TestCase):
         # Assertions
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         # Asserting to check ingredients present in recipe?
-        for ingredient in payload['ingredients']:
-            exists = Ingredient.objects.filter(
-                user=self.user,
-                name=ingredient['name']
-            ).exists()
-
-            self.assertTrue(exists)
+        ingredient_names = recipe.ingredients.filter(
+            user=self.user).values_list('name', flat=True)
+        self.assertCountEqual(
+            ingredient_names,
+            [ingredient['name'] for ingredient in payload['ingredients']])
+
+    def test_update_recipe_ingredients_query_count(self):
+        """Test the update response doesn't query the ingredients
+        again, nor their nutrients per ingredient."""
+        query_counts = []
+        for names in [['Salt'], ['Salt', 'Pepper', 'Garlic', 'Basil']]:
+            recipe = create_recipe(user=self.user)
+            payload = {'ingredients': [{'name': name} for name in names]}
+
+            url = recipe_detail_url(recipe.id)
+            with CaptureQueriesContext(connection) as queries:
+                res = self.client.patch(url, payload, format='json')
+
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertCountEqual(
+                [ingredient['name'] for ingredient in res.data['ingredients']],
+                names)
+            query_counts.append(len(queries))
+
+        self.assertEqual(query_counts[0], query_counts[1])
 
     def test_delete_recipe_with_ingredient(self):
         """Test deleting existing recipe which already has an ingredient"""
@@ -617,9 +694,9 @@ class PrivateRecipeAPITests(TestCase):
         res = self.client.get(RECIPE_URL, params)
 
         # Serialize recipe data with JSON
-        recipe1_serialized = RecipeSerializer(recipe1)
-        recipe2_serialized = RecipeSerializer(recipe2)
-        recipe3_serialized = RecipeSerializer(recipe3)
+        recipe1_serialized = RecipeListSerializer(recipe1)
+        recipe2_serialized = RecipeListSerializer(recipe2)
+        recipe3_serialized = RecipeListSerializer(recipe3)
 
         # Assertions
         self.assertEqual(res.status_code, status.HTTP_200_OK)
@@ -646,9 +723,9 @@ class PrivateRecipeAPITests(TestCase):
         res = self.client.get(RECIPE_URL, params)
 
         # Serialized Recipe data to JSON
-        recipe1_serialized = RecipeSerializer(recipe1)
-        recipe2_serialized = RecipeSerializer(recipe2)
-        recipe3_serialized = RecipeSerializer(recipe3)
+        recipe1_serialized = RecipeListSerializer(recipe1)
+        recipe2_serialized = RecipeListSerializer(recipe2)
+        recipe3_serialized = RecipeListSerializer(recipe3)
 
         # Assertions
         self.assertEqual(res.status_code, status.HTTP_200_OK)
@@ -659,12 +736,16 @@ class PrivateRecipeAPITests(TestCase):
 
 class TestRecipeImageUploads(TestCase):
     """Tests for Image uploads to recipe."""
+    client_class = APIClient
+
+    @classmethod
+    def setUpTestData(cls):
+        """Setting up data shared by the test cases."""
+        cls.user = create_user()
 
     def setUp(self):
         """Setting up testing environment"""
-        # Create user and authenticate with API Client
-        self.user = create_user()
-        self.client = APIClient()
+        # Authenticate user with API Client
         self.client.force_authenticate(self.user)
 
         # Create recipe
@@ -4,8 +4,8 @@ Test for the tags APIs.
 """
 from decimal import Decimal
 from django.contrib.auth import get_user_model
-from django.urls import reverse
-from django.test import TestCase
+from django.urls import reverse, reverse_lazy
+from django.test import SimpleTestCase, TestCase
 
 from rest_framework import status
 from rest_framework.test import APIClient
@@ -13,7 +13,9 @@ from rest_framework.test import APIClient
 from core.models import Tag, Recipe
 from ..serializers import TagSerializer
 
-TAG_URL = reverse('recipe:tag-list')
+User = get_user_model()
+
+TAG_URL = reverse_lazy('recipe:tag-list')
 
 
 def tag_detail_url(tag_id: int) -> str:
@@ -23,7 +25,7 @@ def tag_detail_url(tag_id: int) -> str:
 
 def create_user(email, password):
     """Create user directly into the db."""
-    return get_user_model().objects.create_user(email=email, password=password)
+    return User.objects.create_user(email=email, password=password)
 
 
 def create_tag(user, tag_name):
@@ -47,11 +49,9 @@ def create_recipe(user, **params):
     return recipe
 
 
-class PublicTagAPITests(TestCase):
+class PublicTagAPITests(SimpleTestCase):
     """Test case for unauthenticate API requests on Tags."""
-    def setUp(self):
-        """Setting up testing environment."""
-        self.client = APIClient()
+    client_class = APIClient
 
     def test_retrieve_tag_list(self):
         """Test retrieve tag lists"""
@@ -64,12 +64,18 @@ class PublicTagAPITests(TestCase):
 
 class PrivateTagAPITests(TestCase):
     """Test case for testing authenticated Tag API Requests."""
+    client_class = APIClient
+
+    @classmethod
+    def setUpTestData(cls):
+        """Setting up data shared by the test cases."""
+        # Create user and other user
+        cls.user = create_user('test@example.com', 'testPass123')
+        cls.other_user = create_user('otherUser@example.com', 'OtherPass123')
+
     def setUp(self):
         """Setting up testing environment."""
-        # Create user
-        self.user = create_user('test@example.com', 'testPass123')
         # Authorize user to perform HTTP Request.
-        self.client = APIClient()
         self.client.force_authenticate(self.user)
 
     def test_retrieve_tag_list_success(self):
@@ -83,7 +89,7 @@ class PrivateTagAPITests(TestCase):
 
         # Fetch tags from db and Serializer (Convert
         # JSON Respon with DB Response)
-        tags = Tag.objects.all().order_by('-name')
+        tags = Tag.objects.order_by('-name')
         serializer = TagSerializer(tags, many=True)
 
         # Assertions
@@ -91,12 +97,9 @@ class PrivateTagAPITests(TestCase):
         self.assertEqual(res.data, serializer.data)
 
     def test_tags_limited_to_user(self):
-        # Create Other User
-        other_user = create_user('otherUser@example.com', 'OtherPass123')
-
         # Create Tags
-        create_tag(user=other_user, tag_name='Breakfast')
-        create_tag(user=other_user, tag_name='Lunch')
+        create_tag(user=self.other_user, tag_name='Breakfast')
+        create_tag(user=self.other_user, tag_name='Lunch')
         tag = create_tag(user=self.user, tag_name='Dinner')
 
         # HTTP Request to retrieve tag list
@@ -125,6 +128,35 @@ class PrivateTagAPITests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(tag.name, payload['name'])
 
+    def test_create_duplicate_tag_failure(self):
+        """Test creating a tag the user already has fails."""
+        create_tag(user=self.user, tag_name='Lunch')
+        # Same name for another user doesn't clash
+        create_tag(user=self.other_user, tag_name='Dinner')
+
+        res = self.client.post(TAG_URL, {'name': 'Lunch'})
+        other_res = self.client.post(TAG_URL, {'name': 'Dinner'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(other_res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            Tag.objects.filter(user=self.user, name='Lunch').count(), 1)
+
+    def test_rename_tag_to_existing_name_failure(self):
+        """Test renaming a tag to the name of another tag fails."""
+        create_tag(user=self.user, tag_name='Lunch')
+        tag = create_tag(user=self.user, tag_name='Dinner')
+
+        url = tag_detail_url(tag.id)
+        res = self.client.patch(url, {'name': 'Lunch'}, format='json')
+        # Saving the tag under its own name is fine
+        same_res = self.client.patch(url, {'name': 'Dinner'}, format='json')
+
+        tag.refresh_from_db()
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(same_res.status_code, status.HTTP_200_OK)
+        self.assertEqual(tag.name, 'Dinner')
+
     def test_delete_tag(self):
         """Test Deleting a tag."""
         # Create a tag
@@ -173,8 +205,7 @@ class PrivateTagAPITests(TestCase):
         recipe1 = create_recipe(user=self.user, title='Pasta')
         recipe2 = create_recipe(user=self.user, title='Idle')
 
-        recipe1.tags.add(tag)
-        recipe2.tags.add(tag)
+        tag.recipe_set.add(recipe1, recipe2)
 
         res = self.client.get(TAG_URL, {'assigned_only': 1})
 
@@ -4,12 +4,13 @@ Views for the recipe APIs.
 """
 from rest_framework import viewsets, mixins, status
 from rest_framework.decorators import action
+from rest_framework.pagination import LimitOffsetPagination
 from rest_framework.response import Response
 from rest_framework.authentication import TokenAuthentication
 from rest_framework.permissions import IsAuthenticated
 
 from core.models import Recipe, Tag, Ingredient, Nutrient
-from .serializers import (RecipeSerializer,
+from .serializers import (RecipeListSerializer,
                           RecipeDetailSerializer,
                           TagSerializer,
                           IngredientSerializer,
@@ -23,6 +24,22 @@ from drf_spectacular.utils import (extend_schema_view,
                                    OpenApiTypes)
 
 
+class IngredientPagination(LimitOffsetPagination):
+    """Bounds the ingredient list to pages set with ?limit= and
+    ?offset=, keeping the plain array response. The total number of
+    ingredients is sent in the X-Total-Count header."""
+    default_limit = 50
+    max_limit = 100
+
+    def get_paginated_response(self, data):
+        """Return the page as is, with the total in a header."""
+        return Response(data, headers={'X-Total-Count': str(self.count)})
+
+    def get_paginated_response_schema(self, schema):
+        """The page is documented like the unpaginated list."""
+        return schema
+
+
 @extend_schema_view(
     list=extend_schema(
         parameters=[
@@ -56,9 +73,23 @@ class BaseRecipeAttrViewSet(viewsets.GenericViewSet,
         if assigned_only:
             queryset = queryset.filter(recipe__isnull=False)
 
+        # Load the relations rendered by the serializer upfront
+        serializer_class = self.get_serializer_class()
+        if hasattr(serializer_class, 'setup_eager_loading'):
+            queryset = serializer_class.setup_eager_loading(queryset)
+            if self.action == 'list':
+                # Skip columns the serializer doesn't render
+                queryset = queryset.only(
+                    *serializer_class.get_column_names()
+                )
+
         return queryset.filter(
             user=self.request.user).order_by('-name').distinct()
 
+    def perform_create(self, serializer):
+        """Create the object for the authenticated user."""
+        serializer.save(user=self.request.user)
+
 
 @extend_schema_view(
     list=extend_schema(
@@ -100,6 +131,11 @@ class RecipeViewSet(viewsets.ModelViewSet):
         ingredients = self.request.query_params.get('ingredients')
         queryset = self.queryset
 
+        # Load the relations rendered by the serializer upfront
+        serializer_class = self.get_serializer_class()
+        if hasattr(serializer_class, 'setup_eager_loading'):
+            queryset = serializer_class.setup_eager_loading(queryset)
+
         if tags:
             tag_ids = self._params_to_ints(tags)
             queryset = queryset.filter(tags__id__in=tag_ids)
@@ -108,13 +144,19 @@ class RecipeViewSet(viewsets.ModelViewSet):
             ingredient_ids = self._params_to_ints(ingredients)
             queryset = queryset.filter(ingredients__id__in=ingredient_ids)
 
+        if self.action == 'list':
+            # Skip columns the list serializer doesn't render
+            queryset = queryset.only(
+                'id', 'title', 'price', 'time_minutes', 'link', 'user'
+            )
+
         return queryset.filter(
             user=self.request.user).order_by('-id').distinct()
 
     def get_serializer_class(self):
         """Return serializer class for list or detail request."""
         if self.action == 'list':
-            return RecipeSerializer
+            return RecipeListSerializer
         elif self.action == 'upload_image':
             return RecipeImageSerializer
 
@@ -124,6 +166,19 @@ class RecipeViewSet(viewsets.ModelViewSet):
         """Create API for creating a new recipe."""
         serializer.save(user=self.request.user)
 
+    def update(self, request, *args, **kwargs):
+        """Update the recipe, rendering the response from the relations
+        the serializer left prefetched. UpdateModelMixin.update() drops
+        them and queries them again, ingredient nutrients included."""
+        partial = kwargs.pop('partial', False)
+        instance = self.get_object()
+        serializer = self.get_serializer(instance, data=request.data,
+                                         partial=partial)
+        serializer.is_valid(raise_exception=True)
+        self.perform_update(serializer)
+
+        return Response(serializer.data)
+
     @action(methods=['POST'], detail=True, url_path='upload-image')
     def upload_image(self, request, pk=None):
         """Upload image to recipe."""
@@ -146,6 +201,7 @@ class IngredientViewSet(BaseRecipeAttrViewSet):
     """Manage ingredients in database."""
     serializer_class = IngredientSerializer
     queryset = Ingredient.objects.all()
+    pagination_class = IngredientPagination
 
     def get_serializer_class(self):
         """Return the serializer class for the request."""
@@ -154,10 +210,6 @@ class IngredientViewSet(BaseRecipeAttrViewSet):
 
         return self.serializer_class
 
-    def perform_create(self, serializer):
-        """API for creating new ingredient."""
-        serializer.save(user=self.request.user)
-
     @action(methods=['POST'], detail=True, url_path='upload-image')
     def upload_image(self, request, pk=None):
         """Upload image to INGREDIENT."""